@@ -18,6 +18,14 @@ class StreamBodies:
             Understands k/m/g suffixes, i.e. 3m for 3 megabytes.
             """
         )
+        loader.add_option(
+            "stream_read_ahead", int, 0,
+            """
+            Number of body chunks to read ahead from the server while a
+            streamed response is sent to the client. Reading happens in a
+            background thread. 0 disables read-ahead.
+            """
+        )
         loader.add_option(
             "stream_websockets", bool, False,
             """
@@ -32,6 +40,10 @@ class StreamBodies:
                 self.max_size = human.parse_size(ctx.options.stream_large_bodies)
             except ValueError as e:
                 raise exceptions.OptionsError(e)
+        if "stream_read_ahead" in updated and ctx.options.stream_read_ahead < 0:
+            raise exceptions.OptionsError(
+                "Invalid stream read-ahead: %s" % ctx.options.stream_read_ahead
+            )
 
     def run(self, f, is_request):
         if self.max_size:
@@ -1,5 +1,5 @@
 import collections
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from seleniumwire.thirdparty.mitmproxy.coretypes import multidict
 from seleniumwire.thirdparty.mitmproxy.utils import strutils
@@ -17,6 +17,18 @@ def _always_bytes(x):
     return strutils.always_bytes(x, "utf-8", "surrogateescape")
 
 
+# Headers that the proxy looks up for nearly every message. Their values are
+# collected in a single pass over the fields and kept until the fields change.
+_HOT_HEADERS = frozenset((
+    b"content-length",
+    b"expect",
+    b"host",
+    b"proxy-authorization",
+    b"transfer-encoding",
+    b"upgrade",
+))
+
+
 class Headers(multidict.MultiDict):
     """
     Header class which allows both convenient access to individual headers as well as
@@ -89,6 +101,46 @@ class Headers(multidict.MultiDict):
         }
         self.update(headers)
 
+    @property
+    def fields(self):
+        return self._fields
+
+    @fields.setter
+    def fields(self, value):
+        # All modifications replace the fields tuple, which makes this the
+        # single place where the hot header values need to be invalidated.
+        self._fields = value
+        self._hot = None
+
+    def _hot_fields(self) -> Dict[bytes, List[bytes]]:
+        hot = self._hot
+        if hot is None:
+            hot = {}
+            for name, value in self._fields:
+                name = name.lower()
+                if name in _HOT_HEADERS:
+                    hot.setdefault(name, []).append(value)
+            self._hot = hot
+        return hot
+
+    @property
+    def expect_is_100_continue(self) -> bool:
+        """
+        True if the headers carry ``Expect: 100-continue``.
+        """
+        values = self._hot_fields().get(b"expect")
+        return values is not None and b", ".join(values).lower() == b"100-continue"
+
+    @property
+    def upgrade_token(self) -> Optional[str]:
+        """
+        The value of the Upgrade header, or None if there is none.
+        """
+        values = self._hot_fields().get(b"upgrade")
+        if values is None:
+            return None
+        return self._reduce_values([_native(x) for x in values])
+
     @staticmethod
     def _reduce_values(values):
         # Headers can be folded
@@ -120,10 +172,12 @@ class Headers(multidict.MultiDict):
         See also: https://tools.ietf.org/html/rfc7230#section-3.2.2
         """
         name = _always_bytes(name)
-        return [
-            _native(x) for x in
-            super().get_all(name)
-        ]
+        lname = name.lower()
+        if lname in _HOT_HEADERS:
+            values = self._hot_fields().get(lname, ())
+        else:
+            values = super().get_all(name)
+        return [_native(x) for x in values]
 
     def set_all(self, name, values):
         """
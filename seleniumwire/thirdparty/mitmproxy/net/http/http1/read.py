@@ -191,7 +191,7 @@ def expected_http_body_size(
     # http://tools.ietf.org/html/rfc7230#section-3.3
     if not response:
         headers = request.headers
-        if expect_continue_as_0 and headers.get("expect", "").lower() == "100-continue":
+        if expect_continue_as_0 and headers.expect_is_100_continue:
             return 0
     else:
         headers = response.headers
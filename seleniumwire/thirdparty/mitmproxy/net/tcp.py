@@ -2,6 +2,7 @@ import errno
 import os
 import random
 import select
+import selectors
 import socket
 import sys
 import threading
@@ -21,6 +22,12 @@ socket_fileobject = socket.SocketIO
 # Python 3.6 for Windows is missing a constant
 IPPROTO_IPV6 = getattr(socket, "IPPROTO_IPV6", 41)
 
+# The number of buffers sendmsg() accepts at once on common platforms
+IOV_MAX = 1024
+
+# Windows has no sendmsg()
+HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
 
 class _FileLike:
     BLOCKSIZE = 1024 * 32
@@ -98,6 +105,45 @@ class Writer(_FileLike):
             except (SSL.Error, socket.error) as e:
                 raise exceptions.TcpDisconnect(str(e))
 
+    def writelines(self, chunks):
+        """
+            Write several chunks at once. On plain sockets they are handed to
+            the kernel with sendmsg(), without joining them first. Otherwise,
+            e.g. for TLS connections, they are written one after another and
+            flushed once at the end.
+
+            May raise exceptions.TcpDisconnect
+        """
+        chunks = [chunk for chunk in chunks if chunk]
+        # Only a plain socket may be written to directly. A TLS connection
+        # passes unknown attributes through to its raw socket, so checking
+        # for sendmsg() alone would bypass the encryption.
+        if not (
+            HAS_SENDMSG and
+            isinstance(self.o, socket_fileobject) and
+            type(self.o._sock) is socket.socket
+        ):
+            for chunk in chunks:
+                self.write(chunk)
+            self.flush()
+            return
+        sock = self.o._sock
+        if chunks:
+            self.first_byte_timestamp = self.first_byte_timestamp or time.time()
+        for chunk in chunks:
+            self.add_log(chunk)
+        buffers = [memoryview(chunk) for chunk in chunks]
+        try:
+            while buffers:
+                sent = sock.sendmsg(buffers[:IOV_MAX])
+                # Drop whatever has been sent, which may end part way through a buffer
+                while buffers and sent >= len(buffers[0]):
+                    sent -= len(buffers.pop(0))
+                if sent:
+                    buffers[0] = buffers[0][sent:]
+        except socket.error as e:
+            raise exceptions.TcpDisconnect(str(e))
+
 
 class Reader(_FileLike):
 
@@ -670,11 +716,23 @@ class TCPServer:
 
     def serve_forever(self, poll_interval=0.1):
         self.__is_shut_down.clear()
+        # The default selector is epoll/kqueue where available, which unlike
+        # select() is not limited to file descriptors below FD_SETSIZE.
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
+        # Accept without blocking, so that every pending connection can be
+        # taken on each wakeup.
+        self.socket.setblocking(False)
         try:
             while not self.__shutdown_request:
-                r, w_, e_ = select.select([self.socket], [], [], poll_interval)
-                if self.socket in r:
-                    connection, client_address = self.socket.accept()
+                if not selector.select(poll_interval):
+                    continue
+                while True:
+                    try:
+                        connection, client_address = self.socket.accept()
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    connection.setblocking(True)
                     t = basethread.BaseThread(
                         "TCPConnectionHandler (%s: %s:%s -> %s:%s)" % (
                             self.__class__.__name__,
@@ -693,6 +751,7 @@ class TCPServer:
                         self.handle_error(connection, client_address)
                         connection.close()
         finally:
+            selector.close()
             self.__shutdown_request = False
             self.__is_shut_down.set()
 
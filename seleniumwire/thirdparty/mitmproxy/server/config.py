@@ -1,3 +1,4 @@
+import base64
 import os
 import re
 import typing
@@ -7,6 +8,7 @@ from OpenSSL import crypto
 from seleniumwire.thirdparty.mitmproxy import certs, exceptions
 from seleniumwire.thirdparty.mitmproxy import options as moptions
 from seleniumwire.thirdparty.mitmproxy.net import server_spec
+from seleniumwire.thirdparty.mitmproxy.utils import strutils
 
 
 class HostMatcher:
@@ -28,6 +30,69 @@ class HostMatcher:
         return bool(self.patterns)
 
 
+class NoProxyMatcher:
+    """
+    Matches request addresses against the no_proxy list.
+
+    Entries are compiled into a trie keyed on the reversed host labels, so
+    that matching a request is a single descent rather than a scan of the list.
+    Each node may carry the set of allowed ports, where None means any port.
+    Hosts only match on label boundaries: example.com matches www.example.com
+    but not badexample.com.
+    """
+
+    def __init__(self, entries=tuple()):
+        self.entries = list(entries)
+        self.index: dict = {}
+        for addr in self.entries:
+            host, port = self.parse_entry(addr)
+            node = self.index
+            for label in self.labels(host):
+                node = node.setdefault(label, {})
+            node.setdefault(None, set()).add(port)
+
+    @staticmethod
+    def parse_entry(addr):
+        """
+        Split a no_proxy entry into its host and port, where the port is None
+        if not given. IPv6 addresses may be bracketed to specify a port.
+        """
+        addr = addr.strip()
+        if addr.startswith("["):
+            host, _, port = addr[1:].partition("]")
+            port = port[1:]
+        elif addr.count(":") > 1:
+            host, port = addr, ""  # A bare IPv6 address
+        else:
+            host, _, port = addr.partition(":")
+        try:
+            port = int(port) if port else None
+        except ValueError:
+            raise exceptions.OptionsError("Invalid no_proxy entry: %s" % addr)
+        # Leading wildcards and dots have the same meaning as a plain domain
+        return host.lstrip("*").strip("."), port
+
+    @staticmethod
+    def labels(host):
+        # A fully qualified name may end with a dot, which entries never keep
+        host = host.rstrip(".").lower()
+        return reversed(host.split(".")) if host else ()
+
+    def __call__(self, host, port):
+        node = self.index
+        labels = iter(self.labels(host))
+        while node is not None:
+            ports = node.get(None)
+            if ports and (None in ports or port in ports):
+                return True
+            label = next(labels, None)
+            node = node.get(label) if label is not None else None
+        return False
+
+    def __bool__(self):
+        return bool(self.entries)
+
+
 class ProxyConfig:
 
     def __init__(self, options: moptions.Options) -> None:
@@ -36,7 +101,16 @@ class ProxyConfig:
         self.certstore: certs.CertStore
         self.check_filter: typing.Optional[HostMatcher] = None
         self.check_tcp: typing.Optional[HostMatcher] = None
+        self.no_proxy: NoProxyMatcher = NoProxyMatcher()
         self.upstream_server: typing.Optional[server_spec.ServerSpec] = None
+        # Options are copied on every access, so those read for every flow
+        # are kept here and refreshed whenever they change.
+        self.reverse_mode = False
+        self.socks_mode = False
+        self.keep_host_header = False
+        self.relax_http_form_validation = False
+        self.suppress_connection_errors = True
+        self.upstream_auth_header: typing.Optional[typing.Union[str, bytes]] = None
         self.configure(options, set(options.keys()))
         options.changed.connect(self.configure)
 
@@ -53,6 +127,19 @@ class ProxyConfig:
             self.check_filter = HostMatcher(False)
         if "tcp_hosts" in updated:
             self.check_tcp = HostMatcher("tcp", options.tcp_hosts)
+        if "no_proxy" in updated:
+            self.no_proxy = NoProxyMatcher(options.no_proxy)
+        if "mode" in updated:
+            self.reverse_mode = options.mode.startswith("reverse:")
+            self.socks_mode = "socks" in options.mode
+        if "keep_host_header" in updated:
+            self.keep_host_header = options.keep_host_header
+        if "relax_http_form_validation" in updated:
+            self.relax_http_form_validation = options.relax_http_form_validation
+        if "suppress_connection_errors" in updated:
+            self.suppress_connection_errors = options.suppress_connection_errors
+        if "upstream_auth" in updated or "upstream_custom_auth" in updated:
+            self.upstream_auth_header = self.proxy_auth_header(options)
 
         certstore_path = os.path.expanduser(options.confdir)
         if not os.path.exists(os.path.dirname(certstore_path)):
@@ -89,3 +176,16 @@ class ProxyConfig:
         if m.startswith("upstream:") or m.startswith("reverse:"):
             _, spec = server_spec.parse_with_mode(options.mode)
             self.upstream_server = spec
+
+    @staticmethod
+    def proxy_auth_header(options):
+        """The Proxy-Authorization value for the upstream proxy, if configured."""
+        auth = getattr(options, "upstream_custom_auth", None)
+
+        if not auth:
+            auth = getattr(options, "upstream_auth", None)
+
+            if auth:
+                auth = b"Basic " + base64.b64encode(strutils.always_bytes(auth))
+
+        return auth or None
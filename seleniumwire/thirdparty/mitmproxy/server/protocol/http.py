@@ -1,7 +1,8 @@
-import base64
 import enum
 import logging
+import queue
 import textwrap
+import threading
 import time
 
 import h2.exceptions
@@ -11,10 +12,14 @@ from seleniumwire.thirdparty.mitmproxy import exceptions, flow, http
 from seleniumwire.thirdparty.mitmproxy.net import websockets
 from seleniumwire.thirdparty.mitmproxy.server.protocol import base
 from seleniumwire.thirdparty.mitmproxy.server.protocol.websocket import WebSocketLayer
-from seleniumwire.thirdparty.mitmproxy.utils import strutils
 
 log = logging.getLogger(__name__)
 
+# Layer log entries are sent to the master, where seleniumwire's SendToLogger
+# addon emits them on this logger. Debug entries that are costly to format
+# are only created when it would actually output them.
+_entry_log = logging.getLogger("seleniumwire.server")
+
 
 class _HttpTransmissionLayer(base.Layer):
     def read_request_headers(self, flow):
@@ -47,11 +52,17 @@ class _HttpTransmissionLayer(base.Layer):
         response.data.trailers = self.read_response_trailers(request, response)
         return response
 
-    def send_response(self, response):
-        if response.data.content is None:
-            raise exceptions.HttpException("Cannot assemble flow with missing content")
+    def send_response(self, response, chunks=None):
+        """
+        Send a response to the client. If the body chunks are given they are
+        sent as they are, otherwise the body is taken from the response content.
+        """
+        if chunks is None:
+            if response.data.content is None:
+                raise exceptions.HttpException("Cannot assemble flow with missing content")
+            chunks = [response.data.content]
         self.send_response_headers(response)
-        self.send_response_body(response, [response.data.content])
+        self.send_response_body(response, chunks)
         self.send_response_trailers(response)
 
     def send_response_headers(self, response):
@@ -81,6 +92,29 @@ class ConnectServerConnection:
     def via(self):
         return self._ctx.server_conn
 
+    # The attributes used on every request are forwarded explicitly so that
+    # they do not go through a failed lookup and __getattr__ each time.
+
+    @property
+    def rfile(self):
+        return self._ctx.server_conn.rfile
+
+    @property
+    def wfile(self):
+        return self._ctx.server_conn.wfile
+
+    @property
+    def tls_established(self):
+        return self._ctx.server_conn.tls_established
+
+    @property
+    def sni(self):
+        return self._ctx.server_conn.sni
+
+    @property
+    def cert(self):
+        return self._ctx.server_conn.cert
+
     def __getattr__(self, item):
         return getattr(self.via, item)
 
@@ -132,6 +166,59 @@ class UpstreamConnectLayer(base.Layer):
         self.server_conn.address = address
 
 
+def read_ahead(chunks, size):
+    """
+    Consume the chunks in a background thread, buffering up to size of them,
+    so that reading them overlaps with whatever the caller does with each one.
+    Exceptions raised while reading are re-raised to the caller.
+
+    The thread is stopped and joined when the returned generator finishes or
+    is closed, so the chunks are never read once the caller has moved on.
+    Callers must close the generator if they stop iterating early.
+    """
+    buffered = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffered.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except BaseException as e:
+            put(e)
+        else:
+            put(done)
+        finally:
+            # Close the chunks from the thread that read them
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    producer = threading.Thread(target=produce, name="Read ahead", daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = buffered.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
+
+
 def is_ok(status):
     return 200 <= status < 300
 
@@ -144,14 +231,24 @@ class HTTPMode(enum.Enum):
 
 # At this point, we see only a subset of the mitmproxy modes
 MODE_REQUEST_FORMS = {
-    HTTPMode.regular: ("authority", "absolute"),
-    HTTPMode.transparent: ("relative",),
-    HTTPMode.upstream: ("authority", "absolute"),
+    HTTPMode.regular: frozenset({"authority", "absolute"}),
+    HTTPMode.transparent: frozenset({"relative"}),
+    HTTPMode.upstream: frozenset({"authority", "absolute"}),
 }
 
+_VALID_SCHEMES = frozenset({"http", "https"})
+
+_TRANSPARENT_ERR_TEMPLATE = textwrap.dedent(
+    """
+    Mitmproxy received an {} request even though it is not running
+    in regular mode. This usually indicates a misconfiguration,
+    please see the mitmproxy mode documentation for details.
+    """
+).strip()
+
 
 def validate_request_form(mode, request):
-    if request.first_line_format == "absolute" and request.scheme not in ("http", "https"):
+    if request.first_line_format == "absolute" and request.scheme not in _VALID_SCHEMES:
         raise exceptions.HttpException(
             "Invalid request scheme: %s" % request.scheme
         )
@@ -160,20 +257,25 @@ def validate_request_form(mode, request):
         if request.is_http2 and mode is HTTPMode.transparent and request.first_line_format == "absolute":
             return  # dirty hack: h2 may have authority info. will be fixed properly with sans-io.
         if mode == HTTPMode.transparent:
-            err_message = textwrap.dedent((
-                """
-                Mitmproxy received an {} request even though it is not running
-                in regular mode. This usually indicates a misconfiguration,
-                please see the mitmproxy mode documentation for details.
-                """
-            )).strip().format("HTTP CONNECT" if request.first_line_format == "authority" else "absolute-form")
+            err_message = _TRANSPARENT_ERR_TEMPLATE.format(
+                "HTTP CONNECT" if request.first_line_format == "authority" else "absolute-form"
+            )
         else:
             err_message = "Invalid HTTP request form (expected: %s, got: %s)" % (
-                " or ".join(allowed_request_forms), request.first_line_format
+                " or ".join(sorted(allowed_request_forms)), request.first_line_format
             )
         raise exceptions.HttpException(err_message)
 
 
+def request_form_fields(request):
+    """
+    The raw request fields that validate_request_form depends on, so that a
+    request only needs validating again if one of them has changed.
+    """
+    data = request.data
+    return data.method, data.authority, data.scheme, data.http_version
+
+
 class HttpLayer(base.Layer):
 
     if False:
@@ -182,7 +284,7 @@ class HttpLayer(base.Layer):
 
     def __init__(self, ctx, mode):
         super().__init__(ctx)
-        self.mode = mode
+        self.set_mode(mode)
         self.__initial_server_address: tuple = None
         "Contains the original destination in transparent mode, which needs to be restored"
         "if an inline script modified the target server for a single http request"
@@ -192,8 +294,19 @@ class HttpLayer(base.Layer):
         # Requests happening after CONNECT do not need Proxy-Authorization headers.
         self.connect_request = False
 
+    def set_mode(self, mode):
+        """
+        Set the HTTP mode, along with the flags that the flow handling checks
+        in place of comparing against the HTTPMode members on every request.
+        """
+        self.mode = mode
+        self._mode_name = mode.name
+        self._is_regular = mode is HTTPMode.regular
+        self._is_transparent = mode is HTTPMode.transparent
+        self._is_upstream = mode is HTTPMode.upstream
+
     def __call__(self):
-        if self.mode == HTTPMode.transparent:
+        if self._is_transparent:
             self.__initial_server_tls = self.server_tls
             self.__initial_server_address = self.server_conn.address
         while True:
@@ -201,7 +314,7 @@ class HttpLayer(base.Layer):
                 self.client_conn,
                 self.server_conn,
                 live=self,
-                mode=self.mode.name
+                mode=self._mode_name
             )
             if not self._process_flow(flow):
                 return
@@ -245,10 +358,11 @@ class HttpLayer(base.Layer):
             )
             self.send_request(f.request)
             f.response = self.read_response_headers()
-            f.response.data.content = b"".join(
-                self.read_response_body(f.request, f.response)
-            )
-        self.send_response(f.response)
+            # No script hook sees the upstream proxy's reply, so relay the
+            # body chunks as they are read instead of assembling the content.
+            self.send_response(f.response, self.read_response_body(f.request, f.response))
+        else:
+            self.send_response(f.response)
         if is_ok(f.response.status_code):
             layer = UpstreamConnectLayer(self, f.request)
             return layer()
@@ -260,7 +374,102 @@ class HttpLayer(base.Layer):
 
         return False
 
-    def _process_flow(self, f):
+    def _handle_connect_request(self, f: http.HTTPFlow) -> bool:
+        # The standards are silent on what we should do with a CONNECT
+        # request body, so although it's not common, it's allowed.
+        # Almost all CONNECT requests have no body though, so avoid
+        # reading one unless the headers announce it.
+        content_length = f.request.headers.get("content-length")
+        if (content_length is None or content_length == "0") and \
+                "transfer-encoding" not in f.request.headers:
+            f.request.data.content = b""
+            f.request.data.trailers = None
+        else:
+            f.request.data.content = b"".join(
+                self.read_request_body(f.request)
+            )
+            f.request.data.trailers = self.read_request_trailers(f.request)
+        f.request.data.timestamp_end = time.time()
+        self.channel.ask("http_connect", f)
+
+        if self._is_regular:
+            return self.handle_regular_connect(f)
+        elif self._is_upstream:
+            self.apply_proxy_auth(f)
+            return self.handle_upstream_connect(f)
+        else:
+            msg = "Unexpected CONNECT request."
+            self.send_error_response(400, msg)
+            return False
+
+    def _resolve_request_target(self, f: http.HTTPFlow) -> None:
+        request = f.request
+
+        # set first line format to relative in regular mode,
+        # see https://github.com/mitmproxy/mitmproxy/issues/1759
+        if self._is_regular and request.first_line_format == "absolute":
+            request.authority = ""
+
+        # update host header in reverse mitmproxy mode
+        if self.config.reverse_mode and not self.config.keep_host_header:
+            request.host_header = self.config.upstream_server.address[0]
+
+        # Determine .scheme, .host and .port attributes for inline scripts. For
+        # absolute-form requests, they are directly given in the request. For
+        # authority-form requests, we only need to determine the request
+        # scheme. For relative-form requests, we need to determine host and
+        # port as well.
+        if self._is_transparent:
+            # Setting request.host also updates the host header, which we want
+            # to preserve
+            request.data.host = self.__initial_server_address[0]
+            request.data.port = self.__initial_server_address[1]
+            request.data.scheme = b"https" if self.__initial_server_tls else b"http"
+
+    def _emit_request_upstream(self, f: http.HTTPFlow) -> None:
+        request = f.request
+        if request.stream:
+            self.send_request_headers(request)
+            chunks = self.read_request_body(request)
+            if callable(request.stream):
+                chunks = request.stream(chunks)
+            self.send_request_body(request, chunks)
+            self.send_request_trailers(request)
+        else:
+            # The whole request is known, so let the transmission
+            # layer send it at once (a single write for HTTP/1).
+            self.send_request(request)
+
+        f.response = self.read_response_headers()
+
+    def _emit_response_downstream(self, f: http.HTTPFlow) -> None:
+        response = f.response
+        if not response.stream:
+            # no streaming:
+            # we already received the full response from the server and can
+            # send it to the client straight away.
+            self.send_response(response)
+        else:
+            # streaming:
+            # First send the headers and then transfer the response incrementally
+            self.send_response_headers(response)
+            chunks = self.read_response_body(f.request, response)
+            ahead = None
+            read_ahead_size = self.config.options.stream_read_ahead
+            if read_ahead_size:
+                chunks = ahead = read_ahead(chunks, read_ahead_size)
+            if callable(response.stream):
+                chunks = response.stream(chunks)
+            try:
+                self.send_response_body(response, chunks)
+            finally:
+                if ahead is not None:
+                    # Stop reading from the server before the connection is
+                    # used again or torn down
+                    ahead.close()
+            response.data.timestamp_end = time.time()
+
+    def _process_flow(self, f: http.HTTPFlow) -> bool:
         try:
             try:
                 request: http.HTTPRequest = self.read_request_headers(f)
@@ -271,44 +480,30 @@ class HttpLayer(base.Layer):
 
             f.request = request
 
-            if (self.mode is HTTPMode.upstream or "socks" in self.config.options.mode) and \
+            if (self._is_upstream or self.config.socks_mode) and \
                     self.matches_no_proxy(f.request):
                 self.set_server((f.request.host, f.request.port))
-                self.mode = HTTPMode.regular
+                self.set_mode(HTTPMode.regular)
                 self.server_conn.use_socks = False
 
             if request.first_line_format == "authority":
-                # The standards are silent on what we should do with a CONNECT
-                # request body, so although it's not common, it's allowed.
-                f.request.data.content = b"".join(
-                    self.read_request_body(f.request)
-                )
-                f.request.data.trailers = self.read_request_trailers(f.request)
-                f.request.timestamp_end = time.time()
-                self.channel.ask("http_connect", f)
-
-                if self.mode is HTTPMode.regular:
-                    return self.handle_regular_connect(f)
-                elif self.mode is HTTPMode.upstream:
-                    self.apply_proxy_auth(f)
-                    return self.handle_upstream_connect(f)
-                else:
-                    msg = "Unexpected CONNECT request."
-                    self.send_error_response(400, msg)
-                    return False
+                return self._handle_connect_request(f)
 
-            if not self.config.options.relax_http_form_validation:
+            # Read once, so that both checks agree even if the option changes
+            relax_form = self.config.relax_http_form_validation
+            if not relax_form:
                 validate_request_form(self.mode, request)
+                form = request_form_fields(request)
             self.channel.ask("requestheaders", f)
 
-            if self.mode is HTTPMode.upstream and not f.server_conn.via:
+            if self._is_upstream and not f.server_conn.via:
                 self.apply_proxy_auth(f)
 
             # Re-validate request form in case the user has changed something.
-            if not self.config.options.relax_http_form_validation:
+            if not relax_form and form != request_form_fields(request):
                 validate_request_form(self.mode, request)
 
-            if request.headers.get("expect", "").lower() == "100-continue":
+            if request.headers.expect_is_100_continue:
                 # TODO: We may have to use send_response_headers for HTTP2
                 # here.
                 self.send_response(http.make_expect_continue_response())
@@ -321,7 +516,7 @@ class HttpLayer(base.Layer):
 
             f.request.data.trailers = self.read_request_trailers(f.request)
 
-            request.timestamp_end = time.time()
+            request.data.timestamp_end = time.time()
         except exceptions.HttpException as e:
             # We optimistically guess there might be an HTTP client on the
             # other end
@@ -331,38 +526,23 @@ class HttpLayer(base.Layer):
             f.error = flow.Error(str(e))
             self.channel.ask("error", f)
             msg = "HTTP protocol error in client request: {}".format(e)
-            if self.config.options.suppress_connection_errors:
+            if self.config.suppress_connection_errors:
                 self.log("request", "debug", [msg])
             else:
                 self.log("request", "warn", [msg])
             return False
 
-        self.log("request", "debug", [repr(request)])
-
-        # set first line format to relative in regular mode,
-        # see https://github.com/mitmproxy/mitmproxy/issues/1759
-        if self.mode is HTTPMode.regular and request.first_line_format == "absolute":
-            request.authority = ""
+        # Formatting the request is costly and debug logs are usually disabled
+        if _entry_log.isEnabledFor(logging.DEBUG):
+            self.log("request", "debug", [repr(request)])
 
-        # update host header in reverse mitmproxy mode
-        if self.config.options.mode.startswith("reverse:") and not self.config.options.keep_host_header:
-            f.request.host_header = self.config.upstream_server.address[0]
-
-        # Determine .scheme, .host and .port attributes for inline scripts. For
-        # absolute-form requests, they are directly given in the request. For
-        # authority-form requests, we only need to determine the request
-        # scheme. For relative-form requests, we need to determine host and
-        # port as well.
-        if self.mode is HTTPMode.transparent:
-            # Setting request.host also updates the host header, which we want
-            # to preserve
-            f.request.data.host = self.__initial_server_address[0]
-            f.request.data.port = self.__initial_server_address[1]
-            f.request.data.scheme = b"https" if self.__initial_server_tls else b"http"
+        self._resolve_request_target(f)
         self.channel.ask("request", f)
 
         try:
-            if websockets.check_handshake(request.headers) and websockets.check_client_version(request.headers):
+            if request.headers.upgrade_token is not None and \
+                    websockets.check_handshake(request.headers) and \
+                    websockets.check_client_version(request.headers):
                 f.metadata['websocket'] = True
                 # We only support RFC6455 with WebSocket version 13
                 # allow inline scripts to manipulate the client handshake
@@ -375,23 +555,8 @@ class HttpLayer(base.Layer):
                     f.request.scheme
                 )
 
-                def get_response():
-                    self.send_request_headers(f.request)
-
-                    if f.request.stream:
-                        chunks = self.read_request_body(f.request)
-                        if callable(f.request.stream):
-                            chunks = f.request.stream(chunks)
-                        self.send_request_body(f.request, chunks)
-                    else:
-                        self.send_request_body(f.request, [f.request.data.content])
-
-                    self.send_request_trailers(f.request)
-
-                    f.response = self.read_response_headers()
-
                 try:
-                    get_response()
+                    self._emit_request_upstream(f)
                 except exceptions.NetlibException as e:
                     self.log(
                         "server communication error: %s" % repr(e),
@@ -424,7 +589,7 @@ class HttpLayer(base.Layer):
 
                     self.disconnect()
                     self.connect()
-                    get_response()
+                    self._emit_request_upstream(f)
 
                 # call the appropriate script hook - this is an opportunity for
                 # an inline script to set f.stream = True
@@ -436,7 +601,7 @@ class HttpLayer(base.Layer):
                     f.response.data.content = b"".join(
                         self.read_response_body(f.request, f.response)
                     )
-                f.response.timestamp_end = time.time()
+                f.response.data.timestamp_end = time.time()
 
                 # no further manipulation of self.server_conn beyond this point
                 # we can safely set it as the final attribute value here.
@@ -448,26 +613,11 @@ class HttpLayer(base.Layer):
 
             f.response.data.trailers = self.read_response_trailers(f.request, f.response)
 
-            self.log("response", "debug", [repr(f.response)])
+            if _entry_log.isEnabledFor(logging.DEBUG):
+                self.log("response", "debug", [repr(f.response)])
             self.channel.ask("response", f)
 
-            if not f.response.stream:
-                # no streaming:
-                # we already received the full response from the server and can
-                # send it to the client straight away.
-                self.send_response(f.response)
-            else:
-                # streaming:
-                # First send the headers and then transfer the response incrementally
-                self.send_response_headers(f.response)
-                chunks = self.read_response_body(
-                    f.request,
-                    f.response
-                )
-                if callable(f.response.stream):
-                    chunks = f.response.stream(chunks)
-                self.send_response_body(f.response, chunks)
-                f.response.timestamp_end = time.time()
+            self._emit_response_downstream(f)
 
             if self.check_close_connection(f):
                 return False
@@ -529,7 +679,7 @@ class HttpLayer(base.Layer):
     def establish_server_connection(self, host: str, port: int, scheme: str):
         tls = (scheme == "https")
 
-        if self.mode is HTTPMode.regular or self.mode is HTTPMode.transparent:
+        if self._is_regular or self._is_transparent:
             # If there's an existing connection that doesn't match our expectations, kill it.
             address = (host, port)
             if address != self.server_conn.address or tls != self.server_tls:
@@ -549,40 +699,11 @@ class HttpLayer(base.Layer):
 
         This checks whether the request address is in the no_proxy list.
         """
-        no_proxy = False
-
-        for addr in self.config.options.no_proxy:
-            host, *port = addr.split(':')
-
-            if request.host.endswith(host):
-                no_proxy = True
-
-                if port:
-                    # The user has specified a port, so this also needs to match
-                    no_proxy = int(port[0]) == request.port
-
-            if no_proxy:
-                break
-
-        return no_proxy
+        return self.config.no_proxy(request.host, request.port)
 
     def apply_proxy_auth(self, f):
         """Apply proxy authorization to the request if configured."""
-        auth = None
-
-        try:
-            auth = self.config.options.upstream_custom_auth
-        except AttributeError:
-            pass
-
-        if not auth:
-            try:
-                auth = self.config.options.upstream_auth
-
-                if auth:
-                    auth = b"Basic" + b" " + base64.b64encode(strutils.always_bytes(auth))
-            except AttributeError:
-                pass
+        auth = self.config.upstream_auth_header
 
-        if auth:
+        if auth is not None:
             f.request.headers["Proxy-Authorization"] = auth
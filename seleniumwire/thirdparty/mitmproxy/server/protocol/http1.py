@@ -1,3 +1,4 @@
+from seleniumwire.thirdparty.mitmproxy import exceptions
 from seleniumwire.thirdparty.mitmproxy.net.http import http1
 from seleniumwire.thirdparty.mitmproxy.server.protocol import http as httpbase
 from seleniumwire.thirdparty.mitmproxy.utils import human
@@ -41,7 +42,14 @@ class Http1Layer(httpbase._HttpTransmissionLayer):
         pass
 
     def send_request(self, request):
-        self.server_conn.wfile.write(http1.assemble_request(request))
+        if request.data.content is None:
+            raise exceptions.HttpException("Cannot assemble flow with missing content")
+        # The whole request is known, so the head and body can be written
+        # together without copying the body into a single buffer first
+        self.server_conn.wfile.writelines([
+            http1.assemble_request_head(request),
+            *http1.assemble_body(request.headers, [request.data.content], request.trailers)
+        ])
         self.server_conn.wfile.flush()
 
     def read_response_headers(self):
@@ -62,6 +70,16 @@ class Http1Layer(httpbase._HttpTransmissionLayer):
             self.log("HTTP/1.1 trailer headers are not implemented yet!", "warn")
         return None
 
+    def send_response(self, response, chunks=None):
+        if chunks is not None or response.data.content is None:
+            return super().send_response(response, chunks)
+        # The whole response is known, so the head and body can be written together
+        self.client_conn.wfile.writelines([
+            http1.assemble_response_head(response),
+            *http1.assemble_body(response.headers, [response.data.content], response.trailers)
+        ])
+        self.client_conn.wfile.flush()
+
     def send_response_headers(self, response):
         raw = http1.assemble_response_head(response)
         self.client_conn.wfile.write(raw)
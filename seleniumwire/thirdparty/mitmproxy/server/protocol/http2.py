@@ -632,7 +632,7 @@ class Http2SingleStreamLayer(httpbase._HttpTransmissionLayer, basethread.BaseThr
     @detect_zombie_stream
     def send_request(self, request):
         self.send_request_headers(request)
-        self.send_request_body(request, [request.content])
+        self.send_request_body(request, [request.data.content])
         self.send_request_trailers(request)
 
     @detect_zombie_stream
@@ -0,0 +1,142 @@
+import copy
+from unittest import TestCase
+
+from seleniumwire.thirdparty.mitmproxy.net.http import Request
+from seleniumwire.thirdparty.mitmproxy.net.http.headers import Headers
+from seleniumwire.thirdparty.mitmproxy.net.http.http1 import expected_http_body_size
+
+
+class HeadersTest(TestCase):
+    def setUp(self):
+        self.headers = Headers(
+            [
+                (b'Host', b'example.com'),
+                (b'Content-Length', b'5'),
+                (b'Accept', b'text/html'),
+            ]
+        )
+        # Look up a hot header first, so that the tests see a populated cache
+        self.assertEqual('example.com', self.headers['host'])
+
+    def test_hot_headers_case_insensitive(self):
+        self.assertEqual('example.com', self.headers['HOST'])
+        self.assertEqual('5', self.headers.get('content-length'))
+        self.assertIn('CONTENT-LENGTH', self.headers)
+        self.assertEqual(['5'], self.headers.get_all('Content-length'))
+
+    def test_other_headers(self):
+        self.assertEqual('text/html', self.headers['accept'])
+        self.assertNotIn('upgrade', self.headers)
+
+    def test_setitem(self):
+        self.headers['host'] = 'other.com'
+        self.headers['Upgrade'] = 'websocket'
+
+        self.assertEqual('other.com', self.headers['Host'])
+        self.assertEqual('websocket', self.headers.upgrade_token)
+
+    def test_delitem(self):
+        del self.headers['Content-Length']
+
+        self.assertNotIn('content-length', self.headers)
+        self.assertIsNone(self.headers.get('content-length'))
+
+    def test_pop(self):
+        self.headers['Expect'] = '100-continue'
+        self.assertTrue(self.headers.expect_is_100_continue)
+
+        self.headers.pop('expect')
+
+        self.assertFalse(self.headers.expect_is_100_continue)
+
+    def test_add(self):
+        self.headers.add('content-length', '6')
+
+        self.assertEqual(['5', '6'], self.headers.get_all('content-length'))
+
+    def test_insert(self):
+        self.headers.insert(0, 'Expect', '100-continue')
+
+        self.assertTrue(self.headers.expect_is_100_continue)
+
+    def test_set_all(self):
+        self.headers.set_all('Upgrade', ['h2c', 'websocket'])
+
+        self.assertEqual('h2c, websocket', self.headers.upgrade_token)
+
+    def test_set_state(self):
+        self.headers.set_state(((b'Host', b'other.com'), (b'Upgrade', b'websocket')))
+
+        self.assertEqual('other.com', self.headers['host'])
+        self.assertNotIn('content-length', self.headers)
+        self.assertEqual('websocket', self.headers.upgrade_token)
+
+    def test_fields_assigned(self):
+        self.headers.fields = ((b'Expect', b'100-continue'),)
+
+        self.assertNotIn('host', self.headers)
+        self.assertTrue(self.headers.expect_is_100_continue)
+
+    def test_expect_is_100_continue(self):
+        self.assertFalse(self.headers.expect_is_100_continue)
+
+        self.headers['expect'] = '100-Continue'
+
+        self.assertTrue(self.headers.expect_is_100_continue)
+
+    def test_expect_folded(self):
+        self.headers.add('Expect', '100-continue')
+        self.headers.add('EXPECT', 'something-else')
+
+        self.assertEqual('100-continue, something-else', self.headers['expect'])
+        self.assertFalse(self.headers.expect_is_100_continue)
+
+    def test_upgrade_token(self):
+        self.assertIsNone(self.headers.upgrade_token)
+
+        self.headers['UPGRADE'] = 'websocket'
+
+        self.assertEqual('websocket', self.headers.upgrade_token)
+
+    def test_upgrade_folded(self):
+        self.headers.add('Upgrade', 'h2c')
+        self.headers.add('upgrade', 'websocket')
+
+        self.assertEqual('h2c, websocket', self.headers.upgrade_token)
+
+    def test_copy(self):
+        headers = copy.copy(self.headers)
+        headers['host'] = 'other.com'
+
+        self.assertEqual('example.com', self.headers['host'])
+        self.assertEqual('other.com', headers['host'])
+
+    def test_deepcopy(self):
+        headers = copy.deepcopy(self.headers)
+        del headers['content-length']
+
+        self.assertEqual('5', self.headers['content-length'])
+        self.assertNotIn('content-length', headers)
+
+    def test_copy_of_original_after_change(self):
+        headers = copy.copy(self.headers)
+        self.headers['Upgrade'] = 'websocket'
+
+        self.assertEqual('websocket', self.headers.upgrade_token)
+        self.assertIsNone(headers.upgrade_token)
+
+
+class ExpectedHttpBodySizeTest(TestCase):
+    def test_expect_continue(self):
+        request = Request.make('POST', 'http://example.com/', b'hello', {'Expect': '100-Continue'})
+
+        self.assertEqual(0, expected_http_body_size(request, expect_continue_as_0=True))
+        self.assertEqual(5, expected_http_body_size(request, expect_continue_as_0=False))
+
+    def test_expect_removed(self):
+        request = Request.make('POST', 'http://example.com/', b'hello', {'Expect': '100-continue'})
+        self.assertEqual(0, expected_http_body_size(request))
+
+        request.headers.pop('expect')
+
+        self.assertEqual(5, expected_http_body_size(request))
@@ -0,0 +1,117 @@
+import threading
+from unittest import TestCase
+from unittest.mock import Mock
+
+from seleniumwire.thirdparty.mitmproxy.exceptions import TcpDisconnect
+from seleniumwire.thirdparty.mitmproxy.server.protocol.http import HttpLayer, read_ahead
+
+
+def read_ahead_threads():
+    return [t for t in threading.enumerate() if t.name == 'Read ahead']
+
+
+class Chunks:
+    """An iterator of chunks that records whether it was closed."""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = iter(chunks)
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            if self.error is not None:
+                raise self.error
+            raise
+
+    def close(self):
+        self.closed = True
+
+
+class ReadAheadTest(TestCase):
+    def test_chunks_in_order(self):
+        chunks = [b'%d' % i for i in range(100)]
+
+        self.assertEqual(chunks, list(read_ahead(iter(chunks), 3)))
+        self.assertEqual([], read_ahead_threads())
+
+    def test_no_chunks(self):
+        self.assertEqual([], list(read_ahead(iter([]), 3)))
+
+    def test_exception_reraised(self):
+        chunks = Chunks([b'a', b'b'], error=TcpDisconnect('closed'))
+
+        ahead = read_ahead(chunks, 3)
+
+        self.assertEqual(b'a', next(ahead))
+        self.assertEqual(b'b', next(ahead))
+        with self.assertRaises(TcpDisconnect):
+            next(ahead)
+        self.assertTrue(chunks.closed)
+        self.assertEqual([], read_ahead_threads())
+
+    def test_base_exception_reraised(self):
+        chunks = Chunks([b'a'], error=KeyboardInterrupt())
+
+        with self.assertRaises(KeyboardInterrupt):
+            list(read_ahead(chunks, 3))
+        self.assertEqual([], read_ahead_threads())
+
+    def test_close_early(self):
+        chunks = Chunks(b'%d' % i for i in range(100))
+
+        ahead = read_ahead(chunks, 3)
+        self.assertEqual(b'0', next(ahead))
+        ahead.close()
+
+        # The thread is joined on close and has stopped reading
+        self.assertEqual([], read_ahead_threads())
+        self.assertTrue(chunks.closed)
+        self.assertLess(len(list(chunks)), 96)
+
+    def test_close_unstarted(self):
+        chunks = Chunks([b'a'])
+
+        read_ahead(chunks, 3).close()
+
+        self.assertEqual([], read_ahead_threads())
+        self.assertFalse(chunks.closed)
+
+
+class EmitResponseDownstreamTest(TestCase):
+    def setUp(self):
+        self.layer = Mock()
+        self.layer.config.options.stream_read_ahead = 2
+        self.flow = Mock()
+        self.flow.response.stream = True
+
+    def test_read_ahead(self):
+        sent = []
+        self.layer.read_response_body.return_value = iter([b'a', b'b', b'c'])
+        self.layer.send_response_body.side_effect = lambda response, chunks: sent.extend(chunks)
+
+        HttpLayer._emit_response_downstream(self.layer, self.flow)
+
+        self.assertEqual([b'a', b'b', b'c'], sent)
+        self.assertEqual([], read_ahead_threads())
+
+    def test_read_ahead_stopped_when_send_fails(self):
+        chunks = Chunks(b'%d' % i for i in range(100))
+        self.layer.read_response_body.return_value = chunks
+
+        def send_response_body(response, chunks):
+            next(chunks)
+            raise TcpDisconnect('client disconnected')
+
+        self.layer.send_response_body.side_effect = send_response_body
+
+        with self.assertRaises(TcpDisconnect):
+            HttpLayer._emit_response_downstream(self.layer, self.flow)
+
+        self.assertEqual([], read_ahead_threads())
+        self.assertTrue(chunks.closed)
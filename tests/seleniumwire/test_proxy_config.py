@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from seleniumwire.thirdparty.mitmproxy import addons
+from seleniumwire.thirdparty.mitmproxy.exceptions import OptionsError
+from seleniumwire.thirdparty.mitmproxy.options import Options
+from seleniumwire.thirdparty.mitmproxy.server.config import NoProxyMatcher, ProxyConfig
+
+
+class NoProxyMatcherTest(TestCase):
+    def test_match_host(self):
+        no_proxy = NoProxyMatcher(['example.com'])
+
+        self.assertTrue(no_proxy('example.com', 443))
+        self.assertTrue(no_proxy('www.example.com', 80))
+        self.assertFalse(no_proxy('example.org', 443))
+
+    def test_match_label_boundary(self):
+        no_proxy = NoProxyMatcher(['example.com'])
+
+        self.assertFalse(no_proxy('badexample.com', 443))
+        self.assertFalse(no_proxy('com', 443))
+
+    def test_match_case_insensitive(self):
+        no_proxy = NoProxyMatcher(['Example.COM'])
+
+        self.assertTrue(no_proxy('WWW.example.com', 443))
+
+    def test_match_trailing_dot(self):
+        no_proxy = NoProxyMatcher(['example.com'])
+
+        self.assertTrue(no_proxy('www.example.com.', 443))
+        self.assertTrue(no_proxy('example.com.', 443))
+
+    def test_match_port(self):
+        no_proxy = NoProxyMatcher(['localhost:8080', 'localhost:9090'])
+
+        self.assertTrue(no_proxy('localhost', 8080))
+        self.assertTrue(no_proxy('localhost', 9090))
+        self.assertFalse(no_proxy('localhost', 80))
+
+    def test_match_any_port_and_specific_port(self):
+        no_proxy = NoProxyMatcher(['example.com:8080', 'www.example.com'])
+
+        self.assertTrue(no_proxy('www.example.com', 80))
+        self.assertTrue(no_proxy('example.com', 8080))
+        self.assertFalse(no_proxy('example.com', 80))
+
+    def test_match_wildcard_prefix(self):
+        no_proxy = NoProxyMatcher(['*.example.com', '.example.org'])
+
+        self.assertTrue(no_proxy('www.example.com', 443))
+        self.assertTrue(no_proxy('example.com', 443))
+        self.assertTrue(no_proxy('www.example.org', 443))
+        self.assertFalse(no_proxy('badexample.org', 443))
+
+    def test_match_everything(self):
+        no_proxy = NoProxyMatcher(['*'])
+
+        self.assertTrue(no_proxy('example.com', 443))
+        self.assertTrue(no_proxy('localhost', 8080))
+        self.assertTrue(no_proxy('::1', 80))
+
+    def test_match_ipv4(self):
+        no_proxy = NoProxyMatcher(['127.0.0.1:8080'])
+
+        self.assertTrue(no_proxy('127.0.0.1', 8080))
+        self.assertFalse(no_proxy('127.0.0.1', 80))
+        self.assertFalse(no_proxy('27.0.0.1', 8080))
+
+    def test_match_ipv6_with_port(self):
+        no_proxy = NoProxyMatcher(['[::1]:8080'])
+
+        self.assertTrue(no_proxy('::1', 8080))
+        self.assertFalse(no_proxy('::1', 80))
+
+    def test_match_bare_ipv6(self):
+        no_proxy = NoProxyMatcher(['fe80::1'])
+
+        self.assertTrue(no_proxy('fe80::1', 443))
+        self.assertFalse(no_proxy('fe80::2', 443))
+
+    def test_strip_whitespace(self):
+        no_proxy = NoProxyMatcher(['  example.com:8080 '])
+
+        self.assertTrue(no_proxy('example.com', 8080))
+
+    def test_no_entries(self):
+        no_proxy = NoProxyMatcher()
+
+        self.assertFalse(no_proxy)
+        self.assertFalse(no_proxy('example.com', 443))
+
+    def test_invalid_port(self):
+        with self.assertRaises(OptionsError):
+            NoProxyMatcher(['example.com:http'])
+
+
+class ProxyConfigTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.confdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.confdir, ignore_errors=True)
+
+    def setUp(self):
+        self.options = Options(confdir=os.path.join(self.confdir, '.mitmproxy'))
+        # Add the addons' options, as the master's loader would
+        for addon in addons.default_addons():
+            if hasattr(addon, 'load'):
+                addon.load(self.options)
+        self.config = ProxyConfig(self.options)
+
+    def test_flow_options(self):
+        self.assertFalse(self.config.reverse_mode)
+        self.assertFalse(self.config.socks_mode)
+        self.assertFalse(self.config.keep_host_header)
+        self.assertFalse(self.config.relax_http_form_validation)
+        self.assertTrue(self.config.suppress_connection_errors)
+
+    def test_flow_options_updated(self):
+        self.options.update(
+            keep_host_header=True,
+            relax_http_form_validation=True,
+            suppress_connection_errors=False,
+        )
+
+        self.assertTrue(self.config.keep_host_header)
+        self.assertTrue(self.config.relax_http_form_validation)
+        self.assertFalse(self.config.suppress_connection_errors)
+
+    def test_mode_updated(self):
+        self.options.update(mode='reverse:http://example.com')
+
+        self.assertTrue(self.config.reverse_mode)
+        self.assertFalse(self.config.socks_mode)
+
+        self.options.update(mode='upstream:socks5://example.com:1080')
+
+        self.assertFalse(self.config.reverse_mode)
+        self.assertTrue(self.config.socks_mode)
+
+    def test_no_proxy_updated(self):
+        self.options.update(no_proxy=['example.com'])
+
+        self.assertTrue(self.config.no_proxy('www.example.com', 443))
+
+    def test_no_upstream_auth_header(self):
+        self.assertIsNone(self.config.upstream_auth_header)
+
+    def test_upstream_auth_header(self):
+        self.options.update(upstream_auth='user:pass')
+
+        self.assertEqual(b'Basic dXNlcjpwYXNz', self.config.upstream_auth_header)
+
+        self.options.update(upstream_auth='other:pw')
+
+        self.assertEqual(b'Basic b3RoZXI6cHc=', self.config.upstream_auth_header)
+
+    def test_upstream_custom_auth_header(self):
+        self.options.update(upstream_auth='user:pass', upstream_custom_auth='Bearer token')
+
+        self.assertEqual('Bearer token', self.config.upstream_auth_header)
+
+        self.options.update(upstream_custom_auth=None)
+
+        self.assertEqual(b'Basic dXNlcjpwYXNz', self.config.upstream_auth_header)
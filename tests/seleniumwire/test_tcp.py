@@ -0,0 +1,119 @@
+import socket
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from OpenSSL import SSL
+
+from seleniumwire.thirdparty.mitmproxy import certs
+from seleniumwire.thirdparty.mitmproxy.net.tcp import Writer
+
+
+def recv_all(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class WriterTest(TestCase):
+    def setUp(self):
+        self.sock, self.peer = socket.socketpair()
+        self.addCleanup(self.sock.close)
+        self.addCleanup(self.peer.close)
+
+    def test_writelines(self):
+        wfile = Writer(socket.SocketIO(self.sock, 'wb'))
+
+        wfile.writelines([b'HTTP/1.1 200 OK\r\n\r\n', b'', b'hello'])
+
+        self.assertEqual(b'HTTP/1.1 200 OK\r\n\r\nhello', recv_all(self.peer, 24))
+
+    def test_writelines_partial_sends(self):
+        sendmsg = socket.socket.sendmsg
+        calls = []
+
+        def partial_sendmsg(sock, buffers):
+            # Only accept a few bytes of the first buffer at a time
+            calls.append(len(buffers))
+            return sendmsg(sock, [buffers[0][:3]])
+
+        wfile = Writer(socket.SocketIO(self.sock, 'wb'))
+
+        with patch.object(socket.socket, 'sendmsg', partial_sendmsg):
+            wfile.writelines([b'head\r\n', b'body', b'-end'])
+
+        self.assertEqual(b'head\r\nbody-end', recv_all(self.peer, 14))
+        self.assertEqual(6, len(calls))
+
+    def test_writelines_logs_chunks(self):
+        wfile = Writer(socket.SocketIO(self.sock, 'wb'))
+        wfile.start_log()
+
+        wfile.writelines([b'head\r\n', b'body'])
+
+        self.assertEqual(b'head\r\nbody', wfile.get_log())
+        self.assertIsNotNone(wfile.first_byte_timestamp)
+
+
+class NoSendmsgWriterTest(TestCase):
+    def setUp(self):
+        self.sock, self.peer = socket.socketpair()
+        self.addCleanup(self.sock.close)
+        self.addCleanup(self.peer.close)
+
+    def test_writelines(self):
+        # As on Windows, where sockets have no sendmsg()
+        wfile = Writer(socket.SocketIO(self.sock, 'wb'))
+        wfile.start_log()
+
+        with patch('seleniumwire.thirdparty.mitmproxy.net.tcp.HAS_SENDMSG', False), \
+                patch.object(socket.socket, 'sendmsg') as sendmsg:
+            wfile.writelines([b'HTTP/1.1 200 OK\r\n\r\n', b'hello'])
+
+        self.assertEqual(b'HTTP/1.1 200 OK\r\n\r\nhello', recv_all(self.peer, 24))
+        self.assertEqual(b'HTTP/1.1 200 OK\r\n\r\nhello', wfile.get_log())
+        sendmsg.assert_not_called()
+
+
+class TlsWriterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.key, cls.cert = certs.create_ca('seleniumwire', 'localhost', 3600, 2048)
+
+    def setUp(self):
+        sock, peer = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(peer.close)
+
+        server_context = SSL.Context(SSL.SSLv23_METHOD)
+        server_context.use_privatekey(self.key)
+        server_context.use_certificate(self.cert)
+        self.conn = SSL.Connection(server_context, sock)
+        self.conn.set_accept_state()
+        self.peer = SSL.Connection(SSL.Context(SSL.SSLv23_METHOD), peer)
+        self.peer.set_connect_state()
+
+        handshake = threading.Thread(target=self.peer.do_handshake)
+        handshake.start()
+        self.conn.do_handshake()
+        handshake.join()
+
+    def test_writelines(self):
+        wfile = Writer(socket.SocketIO(self.conn._socket, 'wb'))
+        # As after a TLS handshake in the proxy
+        wfile.set_descriptor(self.conn)
+
+        wfile.writelines([b'HTTP/1.1 200 OK\r\n\r\n', b'secret body'])
+
+        self.assertEqual(b'HTTP/1.1 200 OK\r\n\r\nsecret body', recv_all(self.peer, 30))
+
+    def test_writelines_socket_io(self):
+        wfile = Writer(socket.SocketIO(self.conn, 'wb'))
+
+        wfile.writelines([b'HTTP/1.1 200 OK\r\n\r\n', b'secret body'])
+
+        self.assertEqual(b'HTTP/1.1 200 OK\r\n\r\nsecret body', recv_all(self.peer, 30))